@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.schemas.responses import StandardResponse
-from app.services.firebase_service import FirebaseService
+from app.services.firebase_service import firebase_service
 from app.dependencies import get_current_user
 from app.models.alert import Alert
 from datetime import datetime, timedelta
 from typing import List
 
 router = APIRouter()
-firebase_service = FirebaseService()
 
 @router.post("", response_model=StandardResponse, status_code=201)
 async def create_alert(
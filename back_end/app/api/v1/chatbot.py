@@ -1,30 +1,44 @@
 from fastapi import  HTTPException,APIRouter
 from fastapi.responses import StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware 
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import uuid
-import json
-from langchain_community.llms import Ollama
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.messages import HumanMessage, AIMessage
+import orjson
+import hashlib
+import time
+import redis
+from cachetools import LRUCache
+from langchain_ollama import ChatOllama
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, message_to_dict, messages_from_dict
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from .prompts import create_health_mentor_prompt, get_user_prompt_data
+from langchain_core.runnables import Runnable
+from app.config import get_settings
+from .prompts import get_cached_system_prompt
 
+settings = get_settings()
 router = APIRouter()
 
 MODEL_NAME = "kimi-k2:1t-cloud"  # Change to your model
+MAX_HISTORY_TURNS = 25  # Only the last N user/assistant exchanges are sent to the LLM
+STREAM_FLUSH_CHARS = 64  # Send a streamed chunk once this many characters are buffered...
+STREAM_FLUSH_SECONDS = 0.03  # ...or once this much time has passed since the last send
 # ============================================
 
-# Store conversations in memory (use database in production)
-conversations: Dict[str, ChatMessageHistory] = {}
-
-# Initialize Ollama LLM
-llm = Ollama(
+# Initialize Ollama chat model (async-native, so responses can be streamed without blocking)
+llm = ChatOllama(
     model=MODEL_NAME,
+    base_url=settings.OLLAMA_BASE_URL,
+    client_kwargs={"timeout": 300},
 )
 
+# One Redis client (and connection pool) shared by every conversation history
+_redis_client = redis.Redis.from_url(settings.REDIS_URL)
+
+# Composed prompt | llm | parser chains, keyed by a digest of the system prompt
+_chain_cache: LRUCache = LRUCache(maxsize=2000)
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -39,17 +53,68 @@ class ConversationResponse(BaseModel):
     conversation_id: str
     messages: List[Dict[str, str]]
 
-# Helper function to get or create conversation
-def get_conversation(conv_id: str) -> ChatMessageHistory:
-    if conv_id not in conversations:
-        conversations[conv_id] = ChatMessageHistory()
-    return conversations[conv_id]
+class _SharedRedisChatMessageHistory(RedisChatMessageHistory):
+    """
+    RedisChatMessageHistory on the shared client (the base class opens a new pool per
+    instance), keeping only the last MAX_HISTORY_TURNS exchanges in Redis
+    """
+    
+    def __init__(self, session_id: str, ttl: Optional[int] = None):
+        self.redis_client = _redis_client
+        self.session_id = session_id
+        self.key_prefix = "message_store:"
+        self.ttl = ttl
+    
+    @property
+    def messages(self) -> List[BaseMessage]:
+        # Newest messages are at the head of the list (LPUSH), so read only those
+        items = self.redis_client.lrange(self.key, 0, 2 * MAX_HISTORY_TURNS - 1)
+        return messages_from_dict([orjson.loads(item) for item in items[::-1]])
+    
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+    
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        # Append, trim to the cap and refresh the TTL in one round trip
+        pipe = self.redis_client.pipeline()
+        for message in messages:
+            pipe.lpush(self.key, orjson.dumps(message_to_dict(message)))
+        pipe.ltrim(self.key, 0, 2 * MAX_HISTORY_TURNS - 1)
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+
+# Helper function to get or create conversation (stored in Redis, shared across workers)
+def get_conversation(conv_id: str) -> RedisChatMessageHistory:
+    return _SharedRedisChatMessageHistory(conv_id, ttl=settings.CONVERSATION_TTL_SECONDS)
 
 
-# Helper function to get user profile
-async def get_user_profile(user_id: str) -> Optional[dict]:
-    """Fetch user profile data from Firebase"""
-    return await get_user_prompt_data(user_id)
+# Helper function to get the most recent turns for the prompt
+# (aget_messages runs the Redis call off the event loop)
+async def get_recent_messages(history: RedisChatMessageHistory) -> list:
+    return await history.aget_messages()
+
+
+# Helper function to get (or build once) the chain for a system prompt
+def get_chain(system_prompt: str) -> Runnable:
+    key = hashlib.blake2b(system_prompt.encode(), digest_size=16).digest()
+    chain = _chain_cache.get(key)
+    if chain is None:
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}")
+        ])
+        chain = prompt | llm | StrOutputParser()
+        _chain_cache[key] = chain
+    return chain
+
+
+# Helper function to encode one server-sent event frame
+def _sse_event(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
 
 # Non-Streaming Chat Endpoint
 @router.post("/chat", response_model=ChatResponse)
@@ -58,37 +123,31 @@ async def chat(request: ChatRequest):
     Send a message and get the complete health mentor response.
     Returns the full response at once (non-streaming).
     """
-    # Fetch user profile
-    user_profile = await get_user_profile(request.user_id)
+    # Get personalized system prompt (cached per user)
+    system_prompt = await get_cached_system_prompt(request.user_id)
     
-    if not user_profile:
+    if not system_prompt:
         raise HTTPException(status_code=404, detail="User profile not found")
     
-    # Create personalized system prompt
-    system_prompt = create_health_mentor_prompt(user_profile)
-    
     conv_id = request.conversation_id or str(uuid.uuid4())
     history = get_conversation(conv_id)
     
-    # Create prompt template with personalized system message
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}")
-    ])
-    
-    chain = prompt | llm | StrOutputParser()
+    # Get chain with personalized system message
+    chain = get_chain(system_prompt)
     
     try:
-        # Get complete response
-        response = chain.invoke({
-            "history": history.messages,
+        # Get complete response (streamed from Ollama and joined, which is much
+        # faster than waiting for a buffered non-streaming reply)
+        parts = []
+        async for chunk in chain.astream({
+            "history": await get_recent_messages(history),
             "input": request.message
-        })
+        }):
+            parts.append(chunk)
+        response = "".join(parts)
         
         # Add to conversation history
-        history.add_user_message(request.message)
-        history.add_ai_message(response)
+        await history.aadd_messages([HumanMessage(content=request.message), AIMessage(content=response)])
         
         return ChatResponse(
             response=response,
@@ -105,46 +164,50 @@ async def chat_stream(request: ChatRequest):
     """
     Stream the health mentor response personalized to user.
     """
-    # Fetch user profile
-    user_profile = await get_user_profile(request.user_id)
+    # Get personalized system prompt (cached per user)
+    system_prompt = await get_cached_system_prompt(request.user_id)
     
-    if not user_profile:
+    if not system_prompt:
         raise HTTPException(status_code=404, detail="User profile not found")
     
-    # Create personalized system prompt
-    system_prompt = create_health_mentor_prompt(user_profile)
-    
     conv_id = request.conversation_id or str(uuid.uuid4())
     history = get_conversation(conv_id)
     
-    # Create prompt template with personalized system message
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}")
-    ])
-    
-    chain = prompt | llm | StrOutputParser()
+    # Get chain with personalized system message
+    chain = get_chain(system_prompt)
     
     async def generate():
         try:
-            full_response = ""
-            yield f"data: {json.dumps({'conversation_id': conv_id, 'type': 'start'})}\n\n"
+            parts = []
+            buf = ""
+            last_flush = time.monotonic()
+            yield _sse_event({'conversation_id': conv_id, 'type': 'start'})
             
-            for chunk in chain.stream({
-                "history": history.messages,
+            # Batch small token chunks into fewer SSE frames
+            async for chunk in chain.astream({
+                "history": await get_recent_messages(history),
                 "input": request.message
             }):
-                full_response += chunk
-                yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'})}\n\n"
+                parts.append(chunk)
+                buf += chunk
+                now = time.monotonic()
+                if len(buf) >= STREAM_FLUSH_CHARS or now - last_flush >= STREAM_FLUSH_SECONDS:
+                    yield _sse_event({'content': buf, 'type': 'chunk'})
+                    buf = ""
+                    last_flush = now
+            
+            if buf:
+                yield _sse_event({'content': buf, 'type': 'chunk'})
             
-            history.add_user_message(request.message)
-            history.add_ai_message(full_response)
+            await history.aadd_messages([
+                HumanMessage(content=request.message),
+                AIMessage(content="".join(parts)),
+            ])
             
-            yield f"data: {json.dumps({'type': 'end'})}\n\n"
+            yield _sse_event({'type': 'end'})
             
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e), 'type': 'error'})}\n\n"
+            yield _sse_event({'error': str(e), 'type': 'error'})
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
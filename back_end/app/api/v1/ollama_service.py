@@ -1,8 +1,12 @@
-from ollama import chat
+from ollama import AsyncClient
+from app.config import get_settings
 
+settings = get_settings()
 
-def analyse_image(path):
-    prompt="""
+# Shared async client so vision requests reuse one HTTP connection pool
+_client = AsyncClient(host=settings.OLLAMA_BASE_URL)
+
+_VISION_PROMPT = """
     You are an expert nutrition specialist and food analyst. Your task is to analyze images of food and provide detailed nutritional information.
 
 INSTRUCTIONS:
@@ -41,5 +45,8 @@ IMPORTANT GUIDELINES:
 - Be transparent about estimation limitations in the notes field
 - Always return valid JSON only, no additional text outside the JSON structure
 """
-    response=chat(model="qwen3-vl:235b-instruct-cloud", messages=[{"role": "user", "content": prompt,"images": [path]}])
+
+
+async def analyse_image(image_b64: str):
+    response=await _client.chat(model="qwen3-vl:235b-instruct-cloud", messages=[{"role": "user", "content": _VISION_PROMPT,"images": [image_b64]}])
     return response.message.content
\ No newline at end of file
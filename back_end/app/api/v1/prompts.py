@@ -1,5 +1,76 @@
+import asyncio
+import logging
+from dataclasses import dataclass
 from typing import Optional
-from app.services.firebase_service import FirebaseService
+import redis.asyncio as redis
+from cachetools import TTLCache
+from app.config import get_settings
+from app.services.firebase_service import firebase_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Rendered system prompts per (user_id, prompt version)
+_prompt_cache: TTLCache = TTLCache(maxsize=2000, ttl=300)
+
+# Prompt versions live in Redis so a profile update invalidates the cached prompt in
+# every worker. Because the version is part of the cache key, a miss that started
+# before the update can't store its stale prompt under the new version.
+# Short timeouts: an unreachable Redis should bypass the cache, not stall requests.
+_redis_client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+_PROMPT_VERSION_KEY = "prompt_version:{}"
+_PROMPT_VERSION_TTL_SECONDS = 86400  # Far longer than the prompt cache TTL
+
+
+@dataclass(frozen=True)
+class NormalizedProfile:
+    """User profile with defaults applied and types normalized, ready for prompt rendering"""
+    # Declared by hand: dataclass(slots=True) needs Python 3.10
+    __slots__ = (
+        'user_id', 'age', 'gender', 'weight_kg', 'height_cm', 'activity_level',
+        'has_hypertension', 'has_diabetes', 'has_heart_condition', 'has_asthma',
+        'has_high_cholesterol', 'has_thyroid_disorder', 'other_conditions',
+        'allergies', 'medications', 'medical_conditions',
+        'goal_type', 'goal_intensity', 'target_weight_kg', 'fitness_goals',
+        'daily_calorie_goal', 'daily_step_goal', 'daily_distance_goal',
+        'daily_active_minutes_goal', 'daily_protein_goal', 'daily_carbs_goal', 'daily_fats_goal',
+    )
+    
+    user_id: str
+    age: int
+    gender: str
+    weight_kg: float
+    height_cm: float
+    activity_level: str
+    
+    # Medical conditions
+    has_hypertension: bool
+    has_diabetes: bool
+    has_heart_condition: bool
+    has_asthma: bool
+    has_high_cholesterol: bool
+    has_thyroid_disorder: bool
+    other_conditions: Optional[str]
+    
+    # Optional text fields
+    allergies: Optional[str]
+    medications: Optional[str]
+    medical_conditions: Optional[str]
+    
+    # Fitness goals
+    goal_type: Optional[str]
+    goal_intensity: Optional[str]
+    target_weight_kg: Optional[float]
+    fitness_goals: Optional[str]
+    
+    # Daily targets
+    daily_calorie_goal: int
+    daily_step_goal: int
+    daily_distance_goal: float
+    daily_active_minutes_goal: int
+    daily_protein_goal: int
+    daily_carbs_goal: int
+    daily_fats_goal: int
 
 
 async def get_user_prompt_data(user_id: str) -> Optional[dict]:
@@ -7,8 +78,8 @@ async def get_user_prompt_data(user_id: str) -> Optional[dict]:
     Fetch user data from Firebase and prepare it for the health mentor prompt.
     
     This function:
-    1. Retrieves the user's basic info from the 'users' collection
-    2. Retrieves the user's profile data from 'users/{userId}/profile/data'
+    1. Retrieves the user's basic info from the 'users' collection and
+    2. the user's profile data from 'users/{userId}/profile/data' concurrently
     3. Merges both data sources
     4. Returns the combined data ready for prompt generation
     
@@ -23,16 +94,14 @@ async def get_user_prompt_data(user_id: str) -> Optional[dict]:
         if user_data:
             prompt = create_health_mentor_prompt(user_data)
     """
-    firebase_service = FirebaseService()
-    
-    # Fetch user basic information
-    user = await firebase_service.get_user_by_id(user_id)
+    # Fetch user basic information and profile information together
+    user, profile = await asyncio.gather(
+        firebase_service.get_user_by_id(user_id),
+        firebase_service.get_user_profile(user_id),
+    )
     if not user:
         return None
     
-    # Fetch user profile information
-    profile = await firebase_service.get_user_profile(user_id)
-    
     # Merge user and profile data
     combined_data = {**user}
     if profile:
@@ -41,51 +110,49 @@ async def get_user_prompt_data(user_id: str) -> Optional[dict]:
     return combined_data
 
 
-def _normalize_user_data(user_data: dict) -> dict:
+def _normalize_user_data(user_data: dict) -> NormalizedProfile:
     """
     Normalize user data to ensure consistent handling of optional fields and type conversions.
     Handles conversion from Firestore format (has_field_name) to consistent format.
     """
-    normalized = {}
-    
-    # Required fields with defaults
-    normalized['user_id'] = user_data.get('user_id', 'Unknown')
-    normalized['age'] = user_data.get('age') or 0
-    normalized['gender'] = user_data.get('gender') or 'Not specified'
-    normalized['weight_kg'] = user_data.get('weight_kg') or 0.0
-    normalized['height_cm'] = user_data.get('height_cm') or 0.0
-    normalized['activity_level'] = user_data.get('activity_level') or 'Moderate'
-    
-    # Medical conditions (boolean fields)
-    normalized['has_hypertension'] = _parse_bool(user_data.get('has_hypertension'))
-    normalized['has_diabetes'] = _parse_bool(user_data.get('has_diabetes'))
-    normalized['has_heart_condition'] = _parse_bool(user_data.get('has_heart_condition'))
-    normalized['has_asthma'] = _parse_bool(user_data.get('has_asthma'))
-    normalized['has_high_cholesterol'] = _parse_bool(user_data.get('has_high_cholesterol'))
-    normalized['has_thyroid_disorder'] = _parse_bool(user_data.get('has_thyroid_disorder'))
-    normalized['other_conditions'] = user_data.get('other_conditions')
-    
-    # Optional text fields
-    normalized['allergies'] = user_data.get('allergies')
-    normalized['medications'] = user_data.get('medications')
-    normalized['medical_conditions'] = user_data.get('medical_conditions')
-    
-    # Fitness goals
-    normalized['goal_type'] = user_data.get('goal_type')
-    normalized['goal_intensity'] = user_data.get('goal_intensity')
-    normalized['target_weight_kg'] = user_data.get('target_weight_kg')
-    normalized['fitness_goals'] = user_data.get('fitness_goals')
-    
-    # Daily targets with defaults
-    normalized['daily_calorie_goal'] = user_data.get('daily_calorie_goal') or 2000
-    normalized['daily_step_goal'] = user_data.get('daily_step_goal') or 10000
-    normalized['daily_distance_goal'] = user_data.get('daily_distance_goal') or 5.0
-    normalized['daily_active_minutes_goal'] = user_data.get('daily_active_minutes_goal') or 30
-    normalized['daily_protein_goal'] = user_data.get('daily_protein_goal') or 150
-    normalized['daily_carbs_goal'] = user_data.get('daily_carbs_goal') or 250
-    normalized['daily_fats_goal'] = user_data.get('daily_fats_goal') or 70
-    
-    return normalized
+    return NormalizedProfile(
+        # Required fields with defaults
+        user_id=user_data.get('user_id', 'Unknown'),
+        age=user_data.get('age') or 0,
+        gender=user_data.get('gender') or 'Not specified',
+        weight_kg=user_data.get('weight_kg') or 0.0,
+        height_cm=user_data.get('height_cm') or 0.0,
+        activity_level=user_data.get('activity_level') or 'Moderate',
+        
+        # Medical conditions (boolean fields)
+        has_hypertension=_parse_bool(user_data.get('has_hypertension')),
+        has_diabetes=_parse_bool(user_data.get('has_diabetes')),
+        has_heart_condition=_parse_bool(user_data.get('has_heart_condition')),
+        has_asthma=_parse_bool(user_data.get('has_asthma')),
+        has_high_cholesterol=_parse_bool(user_data.get('has_high_cholesterol')),
+        has_thyroid_disorder=_parse_bool(user_data.get('has_thyroid_disorder')),
+        other_conditions=user_data.get('other_conditions'),
+        
+        # Optional text fields
+        allergies=user_data.get('allergies'),
+        medications=user_data.get('medications'),
+        medical_conditions=user_data.get('medical_conditions'),
+        
+        # Fitness goals
+        goal_type=user_data.get('goal_type'),
+        goal_intensity=user_data.get('goal_intensity'),
+        target_weight_kg=user_data.get('target_weight_kg'),
+        fitness_goals=user_data.get('fitness_goals'),
+        
+        # Daily targets with defaults
+        daily_calorie_goal=user_data.get('daily_calorie_goal') or 2000,
+        daily_step_goal=user_data.get('daily_step_goal') or 10000,
+        daily_distance_goal=user_data.get('daily_distance_goal') or 5.0,
+        daily_active_minutes_goal=user_data.get('daily_active_minutes_goal') or 30,
+        daily_protein_goal=user_data.get('daily_protein_goal') or 150,
+        daily_carbs_goal=user_data.get('daily_carbs_goal') or 250,
+        daily_fats_goal=user_data.get('daily_fats_goal') or 70,
+    )
 
 
 def _parse_bool(value) -> bool:
@@ -104,56 +171,90 @@ def _parse_bool(value) -> bool:
     return False
 
 
+# Medical condition flags and how they are named in the prompt (in display order)
+_CONDITION_FLAGS = (
+    ('has_hypertension', 'hypertension'),
+    ('has_diabetes', 'diabetes'),
+    ('has_heart_condition', 'heart condition'),
+    ('has_asthma', 'asthma'),
+    ('has_high_cholesterol', 'high cholesterol'),
+    ('has_thyroid_disorder', 'thyroid disorder'),
+)
+
+# Invariant part of the health mentor prompt, built once at import
+_STATIC_PROMPT_SUFFIX = """# YOUR ROLE & EXPERTISE
+You are a certified health coach specializing in:
+1. **Personalized Nutrition**: Provide meal plans, macro guidance, and dietary advice tailored to the user's goals and medical conditions
+2. **Exercise Programming**: Design safe, effective workout routines considering their fitness level and health constraints
+3. **Lifestyle Optimization**: Offer guidance on sleep, stress management, and daily habits
+4. **Medical Awareness**: Always consider their medical conditions when giving advice. NEVER contradict medical advice or suggest stopping medications.
+
+# CRITICAL SAFETY GUIDELINES
+- ALWAYS account for their medical conditions in your recommendations
+- If they have hypertension: recommend low-sodium foods, avoid intense exercises without clearance
+- If they have diabetes: focus on blood sugar management, emphasize complex carbs and fiber
+- If they have heart conditions: prioritize heart-healthy foods, recommend consulting doctor before intense exercise
+- If they have high cholesterol: suggest foods that lower LDL, emphasize omega-3s
+- NEVER diagnose conditions or suggest stopping prescribed medications
+- For serious symptoms or concerns, ALWAYS recommend consulting their healthcare provider
+- Be especially cautious with supplements if they're on medications
+
+# COMMUNICATION STYLE
+- Be supportive, motivating, and empathetic
+- Use evidence-based recommendations
+- Explain the "why" behind your advice
+- Celebrate progress and encourage consistency
+- Be realistic and sustainable in your suggestions
+- Speak in clear, accessible language (avoid excessive medical jargon)
+- When discussing food, provide specific examples and alternatives
+
+# RESPONSE FORMAT
+- Keep answers concise but informative
+- Use bullet points for lists (meal suggestions, exercise routines)
+- Provide actionable advice they can implement today
+- When relevant, reference their specific goals and conditions
+
+Remember: You're their partner in health, not their doctor. Empower them with knowledge while respecting medical boundaries."""
+
+
 def create_health_mentor_prompt(user_data: dict) -> str:
     """
     Create a personalized system prompt based on user's health profile.
     Handles optional fields gracefully by checking for None/empty values.
     """
     # Normalize and validate user data
-    user_data = _normalize_user_data(user_data)
+    profile = _normalize_user_data(user_data)
     
     # Calculate BMI safely
-    weight = user_data['weight_kg']
-    height = user_data['height_cm']
+    weight = profile.weight_kg
+    height = profile.height_cm
     bmi = weight / ((height / 100) ** 2) if weight > 0 and height > 0 else 0
     
     # Build medical conditions list from boolean flags and other_conditions
-    conditions = []
-    if user_data['has_hypertension']:
-        conditions.append("hypertension")
-    if user_data['has_diabetes']:
-        conditions.append("diabetes")
-    if user_data['has_heart_condition']:
-        conditions.append("heart condition")
-    if user_data['has_asthma']:
-        conditions.append("asthma")
-    if user_data['has_high_cholesterol']:
-        conditions.append("high cholesterol")
-    if user_data['has_thyroid_disorder']:
-        conditions.append("thyroid disorder")
-    if user_data['other_conditions']:
-        conditions.append(user_data['other_conditions'])
+    conditions = [name for flag, name in _CONDITION_FLAGS if getattr(profile, flag)]
+    if profile.other_conditions:
+        conditions.append(profile.other_conditions)
     
     conditions_str = ", ".join(conditions) if conditions else "none reported"
     
     # Build optional field sections with safe defaults
-    allergies_str = user_data['allergies'] or 'none reported'
-    medications_str = user_data['medications'] or 'none reported'
-    goal_type_str = user_data['goal_type'] or 'general wellness'
-    goal_intensity_str = user_data['goal_intensity'] or 'moderate'
-    target_weight_str = f"{user_data['target_weight_kg']:.1f}" if user_data['target_weight_kg'] else 'not set'
-    fitness_goals_str = user_data['fitness_goals'] or 'not specified'
+    allergies_str = profile.allergies or 'none reported'
+    medications_str = profile.medications or 'none reported'
+    goal_type_str = profile.goal_type or 'general wellness'
+    goal_intensity_str = profile.goal_intensity or 'moderate'
+    target_weight_str = f"{profile.target_weight_kg:.1f}" if profile.target_weight_kg else 'not set'
+    fitness_goals_str = profile.fitness_goals or 'not specified'
     
     prompt = f"""You are Alex, an expert health mentor and wellness coach with deep knowledge in nutrition, exercise science, and lifestyle medicine.
 
 # USER PROFILE
-- Name: User #{user_data['user_id'][:8]}
-- Age: {user_data['age']} years old
-- Gender: {user_data['gender']}
+- Name: User #{profile.user_id[:8]}
+- Age: {profile.age} years old
+- Gender: {profile.gender}
 - Weight: {weight:.1f} kg
 - Height: {height:.1f} cm
 - BMI: {bmi:.1f}
-- Activity Level: {user_data['activity_level']}
+- Activity Level: {profile.activity_level}
 
 # MEDICAL CONDITIONS
 {conditions_str}
@@ -169,44 +270,60 @@ def create_health_mentor_prompt(user_data: dict) -> str:
 - Fitness Goals: {fitness_goals_str}
 
 # DAILY TARGETS
-- Calories: {user_data['daily_calorie_goal']} kcal
-- Steps: {user_data['daily_step_goal']} steps
-- Distance: {user_data['daily_distance_goal']} km
-- Active Minutes: {user_data['daily_active_minutes_goal']} minutes
-- Macros: Protein {user_data['daily_protein_goal']}g | Carbs {user_data['daily_carbs_goal']}g | Fats {user_data['daily_fats_goal']}g
+- Calories: {profile.daily_calorie_goal} kcal
+- Steps: {profile.daily_step_goal} steps
+- Distance: {profile.daily_distance_goal} km
+- Active Minutes: {profile.daily_active_minutes_goal} minutes
+- Macros: Protein {profile.daily_protein_goal}g | Carbs {profile.daily_carbs_goal}g | Fats {profile.daily_fats_goal}g
 
-# YOUR ROLE & EXPERTISE
-You are a certified health coach specializing in:
-1. **Personalized Nutrition**: Provide meal plans, macro guidance, and dietary advice tailored to the user's goals and medical conditions
-2. **Exercise Programming**: Design safe, effective workout routines considering their fitness level and health constraints
-3. **Lifestyle Optimization**: Offer guidance on sleep, stress management, and daily habits
-4. **Medical Awareness**: Always consider their medical conditions when giving advice. NEVER contradict medical advice or suggest stopping medications.
+"""
 
-# CRITICAL SAFETY GUIDELINES
-- ALWAYS account for their medical conditions in your recommendations
-- If they have hypertension: recommend low-sodium foods, avoid intense exercises without clearance
-- If they have diabetes: focus on blood sugar management, emphasize complex carbs and fiber
-- If they have heart conditions: prioritize heart-healthy foods, recommend consulting doctor before intense exercise
-- If they have high cholesterol: suggest foods that lower LDL, emphasize omega-3s
-- NEVER diagnose conditions or suggest stopping prescribed medications
-- For serious symptoms or concerns, ALWAYS recommend consulting their healthcare provider
-- Be especially cautious with supplements if they're on medications
+    return prompt + _STATIC_PROMPT_SUFFIX
 
-# COMMUNICATION STYLE
-- Be supportive, motivating, and empathetic
-- Use evidence-based recommendations
-- Explain the "why" behind your advice
-- Celebrate progress and encourage consistency
-- Be realistic and sustainable in your suggestions
-- Speak in clear, accessible language (avoid excessive medical jargon)
-- When discussing food, provide specific examples and alternatives
 
-# RESPONSE FORMAT
-- Keep answers concise but informative
-- Use bullet points for lists (meal suggestions, exercise routines)
-- Provide actionable advice they can implement today
-- When relevant, reference their specific goals and conditions
+async def _get_prompt_version(user_id: str) -> Optional[int]:
+    """Current prompt version for a user, or None if Redis is unavailable"""
+    try:
+        version = await _redis_client.get(_PROMPT_VERSION_KEY.format(user_id))
+    except Exception as e:
+        logger.warning("Prompt version lookup failed, skipping prompt cache: %s", e)
+        return None
+    return int(version) if version else 0
+
+
+async def get_cached_system_prompt(user_id: str) -> Optional[str]:
+    """
+    Return the personalized health mentor system prompt for a user.
+    
+    The rendered prompt is cached for a few minutes so repeat chat turns skip
+    the Firestore lookups and prompt formatting. If Redis is unavailable the
+    cache is bypassed, since profile updates could not be seen.
+    
+    Returns:
+        The system prompt string, or None if the user was not found
+    """
+    version = await _get_prompt_version(user_id)
+    key = (user_id, version)
+    if version is not None:
+        system_prompt = _prompt_cache.get(key)
+        if system_prompt is not None:
+            return system_prompt
+    
+    user_data = await get_user_prompt_data(user_id)
+    if not user_data:
+        return None
+    
+    system_prompt = create_health_mentor_prompt(user_data)
+    if version is not None:
+        _prompt_cache[key] = system_prompt
+    return system_prompt
 
-Remember: You're their partner in health, not their doctor. Empower them with knowledge while respecting medical boundaries."""
 
-    return prompt
\ No newline at end of file
+async def invalidate_system_prompt(user_id: str):
+    """Invalidate the cached system prompt for a user in every worker (call after profile changes)."""
+    key = _PROMPT_VERSION_KEY.format(user_id)
+    try:
+        async with _redis_client.pipeline(transaction=True) as pipe:
+            await pipe.incr(key).expire(key, _PROMPT_VERSION_TTL_SECONDS).execute()
+    except Exception as e:
+        logger.warning("Prompt invalidation failed, cached prompts may be stale for up to 5 minutes: %s", e)
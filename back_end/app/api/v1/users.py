@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.user import UserProfileResponse, UpdateProfileRequest
 from app.schemas.responses import StandardResponse
-from app.services.firebase_service import FirebaseService
+from app.services.firebase_service import firebase_service
 from app.dependencies import get_current_user
+from app.api.v1.prompts import invalidate_system_prompt
 
 router = APIRouter()
-firebase_service = FirebaseService()
 
 @router.get("/me/profile", response_model=UserProfileResponse)
 async def get_my_profile(current_user: dict = Depends(get_current_user)):
@@ -62,6 +62,7 @@ async def update_my_profile(
             raise HTTPException(status_code=400, detail="No fields to update")
         
         await firebase_service.update_user_profile(current_user["user_id"], update_data)
+        await invalidate_system_prompt(current_user["user_id"])
         
         return StandardResponse(
             success=True,
@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.schemas.vitals import SyncVitalsRequest, GetVitalsResponse
 from app.schemas.responses import StandardResponse
-from app.services.firebase_service import FirebaseService
+from app.services.firebase_service import firebase_service
 from app.dependencies import get_current_user
 from app.models.vitals import DailyVitals
 from datetime import datetime, timedelta
 
 router = APIRouter()
-firebase_service = FirebaseService()
 
 @router.post("/sync", response_model=StandardResponse)
 async def sync_daily_vitals(
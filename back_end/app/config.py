@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from pathlib import Path
 from typing import List
 
 class Settings(BaseSettings):
@@ -22,6 +23,19 @@ class Settings(BaseSettings):
     FIREBASE_AUTH_URI: str = "https://accounts.google.com/o/oauth2/auth"
     FIREBASE_TOKEN_URI: str = "https://oauth2.googleapis.com/token"
     FIREBASE_CREDENTIALS_PATH: str = ""  # Path to service account JSON file
+    FIREBASE_KEYS_CACHE_BACKEND: str = "file"  # Where token signing keys are cached: file, redis (uses REDIS_URL) or memory
+    FIREBASE_KEYS_CACHE_DIR: str = str(Path.home() / ".cache" / "healthtrack" / "firebase_public_keys")  # Used by the file backend; must be private (0700, owned by us)
+    
+    # Firebase ID token verification cache
+    AUTH_CACHE_TTL: int = 30  # seconds
+    AUTH_CACHE_SIZE: int = 10000
+    
+    # Redis (chat conversation history)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    CONVERSATION_TTL_SECONDS: int = 3600
+    
+    # Ollama (chatbot LLM)
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
     
     # CORS - Allow all origins for development
     ALLOWED_ORIGINS: str = "*"
@@ -1,7 +1,8 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
-from app.utils.firebase_admin import initialize_firebase
+from app.utils.firebase_admin import initialize_firebase, warm_up_firestore
 from app.api.v1 import auth, users, vitals, activities, alerts, sessions, nutrition , vision
 import uvicorn
 
@@ -12,11 +13,18 @@ settings = get_settings()
 # Initialize Firebase
 initialize_firebase()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the Firestore connection on the serving loop before taking traffic
+    await warm_up_firestore()
+    yield
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     debug=settings.DEBUG,
-    description="HealthTrack Backend API for multi-user health monitoring with cloud sync"
+    description="HealthTrack Backend API for multi-user health monitoring with cloud sync",
+    lifespan=lifespan
 )
 
 # CORS - Allow all origins for development
@@ -1,12 +1,12 @@
 from app.utils.security import SecurityUtils
-from app.services.firebase_service import FirebaseService
-from app.utils.firebase_admin import verify_firebase_token
+from app.services.firebase_service import firebase_service
+from app.utils.firebase_admin import verify_firebase_token_cached
 from datetime import datetime
 from typing import Optional
 
 class AuthService:
     def __init__(self):
-        self.firebase_service = FirebaseService()
+        self.firebase_service = firebase_service
         self.security = SecurityUtils()
     
     async def signup(self, firebase_id_token: str, username: str, full_name: str) -> dict:
@@ -17,7 +17,7 @@ class AuthService:
         then provide the ID token here to create backend user record
         """
         # Verify Firebase ID token
-        decoded_token = verify_firebase_token(firebase_id_token)
+        decoded_token = await verify_firebase_token_cached(firebase_id_token)
         if not decoded_token:
             raise ValueError("Invalid Firebase ID token")
         
@@ -41,11 +41,8 @@ class AuthService:
             'created_at': datetime.utcnow().isoformat()
         }
         
-        user_id = await self.firebase_service.create_user(user_data)
-        
-        # Create default profile
+        # Default profile
         default_profile = {
-            'user_id': user_id,
             'daily_calorie_goal': 2000,
             'daily_step_goal': 10000,
             'daily_distance_goal': 5.0,
@@ -54,7 +51,9 @@ class AuthService:
             'daily_carbs_goal': 250,
             'daily_fats_goal': 70,
         }
-        await self.firebase_service.update_user_profile(user_id, default_profile)
+        
+        # Create user and profile documents in one round-trip
+        user_id = await self.firebase_service.create_user_with_profile(user_data, default_profile)
         
         return {
             'user_id': user_id,
@@ -70,7 +69,7 @@ class AuthService:
         then provide the ID token here to get backend JWT
         """
         # Verify Firebase ID token
-        decoded_token = verify_firebase_token(firebase_id_token)
+        decoded_token = await verify_firebase_token_cached(firebase_id_token)
         if not decoded_token:
             raise ValueError("Invalid Firebase ID token")
         
@@ -1,13 +1,18 @@
+import asyncio
 from typing import List, Dict, Optional
 from datetime import datetime
-from app.utils.firebase_admin import get_firestore_client, initialize_firebase
+from google.cloud import firestore
+from app.utils.firebase_admin import get_firestore_async_client, initialize_firebase
+
+# Firestore rejects WriteBatches with more than 500 writes
+MAX_BATCH_WRITES = 500
 
 
 class FirebaseService:
     def __init__(self):
-        # Get Firestore client
+        # Get asyncio Firestore client
         initialize_firebase()
-        self.db = get_firestore_client()
+        self.db = get_firestore_async_client()
         if self.db is None:
             self.demo_mode = True
             print("⚠️  FirebaseService running in DEMO MODE (no Firebase connection)")
@@ -17,6 +22,62 @@ class FirebaseService:
             print("✅ FirebaseService connected to Firestore")
             print("   All read/write operations will sync to cloud")
     
+    # ==================== BATCH OPERATIONS ====================
+    
+    def write_batch(self):
+        """Start a Firestore WriteBatch (up to 500 writes committed in one round-trip)"""
+        if self.demo_mode:
+            return None
+        
+        return self.db.batch()
+    
+    async def bulk_write(self, ops: List[tuple], chunk_size: int = MAX_BATCH_WRITES, concurrency: int = 5) -> int:
+        """
+        Apply many writes as WriteBatches of at most 500 writes, committing up to
+        `concurrency` batches at a time.
+        
+        Args:
+            ops: (DocumentReference, data, op) tuples where op is 'set', 'update' or 'delete'
+                 (data is ignored for 'delete')
+        
+        Returns:
+            Number of batches committed
+        """
+        if self.demo_mode:
+            return 0
+        
+        chunk_size = min(chunk_size, MAX_BATCH_WRITES)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def commit(batch):
+            async with semaphore:
+                await batch.commit()
+        
+        commits = []
+        for start in range(0, len(ops), chunk_size):
+            batch = self.db.batch()
+            for ref, data, op in ops[start:start + chunk_size]:
+                if op == 'delete':
+                    batch.delete(ref)
+                else:
+                    getattr(batch, op)(ref, data)
+            commits.append(commit(batch))
+        
+        await asyncio.gather(*commits)
+        return len(commits)
+    
+    async def get_many(self, refs: list) -> List[Optional[dict]]:
+        """
+        Read several documents in one BatchGetDocuments round-trip.
+        Returns the documents' data in the same order as refs (None where a document doesn't exist).
+        """
+        if self.demo_mode:
+            return [None] * len(refs)
+        
+        snapshots = [snap async for snap in self.db.get_all(refs)]
+        by_path = {snap.reference.path: snap.to_dict() for snap in snapshots if snap.exists}
+        return [by_path.get(ref.path) for ref in refs]
+    
     # ==================== USER OPERATIONS ====================
     
     async def create_user(self, user_data: dict) -> str:
@@ -27,16 +88,36 @@ class FirebaseService:
         doc_ref = self.db.collection('users').document()
         user_data['id'] = doc_ref.id
         user_data['created_at'] = datetime.utcnow().isoformat()
-        doc_ref.set(user_data)
+        await doc_ref.set(user_data)
         return doc_ref.id
     
+    async def create_user_with_profile(self, user_data: dict, profile_data: dict) -> str:
+        """Create a new user document and its profile in a single batched write"""
+        if self.demo_mode:
+            return "demo_user_" + user_data.get('email', 'test')
+        
+        now = datetime.utcnow().isoformat()
+        user_ref = self.db.collection('users').document()
+        profile_ref = user_ref.collection('profile').document('data')
+        
+        user_data['id'] = user_ref.id
+        user_data['created_at'] = now
+        profile_data['user_id'] = user_ref.id
+        profile_data['updated_at'] = now
+        
+        batch = self.db.batch()
+        batch.set(user_ref, user_data)
+        batch.set(profile_ref, profile_data, merge=True)
+        await batch.commit()
+        return user_ref.id
+    
     async def get_user_by_email(self, email: str) -> Optional[dict]:
         """Get user by email"""
         if self.demo_mode:
             return None
         
         users = self.db.collection('users').where('email', '==', email).limit(1).stream()
-        for user in users:
+        async for user in users:
             data = user.to_dict()
             data['id'] = user.id
             return data
@@ -48,7 +129,7 @@ class FirebaseService:
             return None
         
         users = self.db.collection('users').where('firebase_uid', '==', firebase_uid).limit(1).stream()
-        for user in users:
+        async for user in users:
             data = user.to_dict()
             data['id'] = user.id
             return data
@@ -59,7 +140,7 @@ class FirebaseService:
         if self.demo_mode:
             return {'id': user_id, 'email': 'demo@example.com', 'username': 'demo_user'}
         
-        doc = self.db.collection('users').document(user_id).get()
+        doc = await self.db.collection('users').document(user_id).get()
         if doc.exists:
             data = doc.to_dict()
             data['id'] = doc.id
@@ -72,7 +153,7 @@ class FirebaseService:
             return
         
         data['updated_at'] = datetime.utcnow().isoformat()
-        self.db.collection('users').document(user_id).update(data)
+        await self.db.collection('users').document(user_id).update(data)
     
     # ==================== PROFILE OPERATIONS ====================
     
@@ -93,7 +174,7 @@ class FirebaseService:
                 'daily_fats_goal': 70
             }
         
-        doc = self.db.collection('users').document(user_id).collection('profile').document('data').get()
+        doc = await self.db.collection('users').document(user_id).collection('profile').document('data').get()
         if doc.exists:
             return doc.to_dict()
         return None
@@ -105,7 +186,7 @@ class FirebaseService:
         
         profile_data['user_id'] = user_id
         profile_data['updated_at'] = datetime.utcnow().isoformat()
-        self.db.collection('users').document(user_id).collection('profile').document('data').set(profile_data, merge=True)
+        await self.db.collection('users').document(user_id).collection('profile').document('data').set(profile_data, merge=True)
     
     # ==================== VITALS OPERATIONS ====================
     
@@ -115,7 +196,7 @@ class FirebaseService:
             return
         
         doc_ref = self.db.collection('users').document(user_id).collection('daily_vitals').document(date)
-        doc_ref.set({
+        await doc_ref.set({
             'date': date,
             'readings': readings,
             'summary': summary,
@@ -134,7 +215,7 @@ class FirebaseService:
             .stream()
         
         result = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data['user_id'] = user_id
             result.append(data)
@@ -145,7 +226,7 @@ class FirebaseService:
         if self.demo_mode:
             return None
         
-        doc = self.db.collection('users').document(user_id).collection('daily_vitals').document(date).get()
+        doc = await self.db.collection('users').document(user_id).collection('daily_vitals').document(date).get()
         if doc.exists:
             data = doc.to_dict()
             data['user_id'] = user_id
@@ -161,7 +242,7 @@ class FirebaseService:
         
         activity_data['synced_at'] = datetime.utcnow().isoformat()
         doc_ref = self.db.collection('users').document(user_id).collection('daily_activities').document(date)
-        doc_ref.set(activity_data)
+        await doc_ref.set(activity_data)
     
     async def get_activity_range(self, user_id: str, start_date: str, end_date: str) -> List[dict]:
         """Get activity data for a date range"""
@@ -175,7 +256,7 @@ class FirebaseService:
             .stream()
         
         result = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data['user_id'] = user_id
             result.append(data)
@@ -191,7 +272,7 @@ class FirebaseService:
         doc_ref = self.db.collection('users').document(user_id).collection('sessions').document()
         session_data['id'] = doc_ref.id
         session_data['user_id'] = user_id
-        doc_ref.set(session_data)
+        await doc_ref.set(session_data)
         return doc_ref.id
     
     async def get_sessions(self, user_id: str, limit: int = 50, start_time: Optional[int] = None) -> List[dict]:
@@ -208,7 +289,7 @@ class FirebaseService:
         docs = query.stream()
         
         result = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data['id'] = doc.id
             result.append(data)
@@ -224,7 +305,7 @@ class FirebaseService:
         doc_ref = self.db.collection('users').document(user_id).collection('alerts').document()
         alert_data['id'] = doc_ref.id
         alert_data['user_id'] = user_id
-        doc_ref.set(alert_data)
+        await doc_ref.set(alert_data)
         return doc_ref.id
     
     async def get_alerts(self, user_id: str, limit: int = 50, since_timestamp: Optional[int] = None) -> List[dict]:
@@ -241,7 +322,7 @@ class FirebaseService:
         docs = query.stream()
         
         result = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data['id'] = doc.id
             result.append(data)
@@ -252,7 +333,7 @@ class FirebaseService:
         if self.demo_mode:
             return
         
-        self.db.collection('users').document(user_id).collection('alerts').document(alert_id).update({
+        await self.db.collection('users').document(user_id).collection('alerts').document(alert_id).update({
             'acknowledged': True,
             'acknowledged_at': int(datetime.utcnow().timestamp())
         })
@@ -267,7 +348,7 @@ class FirebaseService:
         doc_ref = self.db.collection('users').document(user_id).collection('nutrition').document()
         nutrition_data['id'] = doc_ref.id
         nutrition_data['user_id'] = user_id
-        doc_ref.set(nutrition_data)
+        await doc_ref.set(nutrition_data)
         return doc_ref.id
     
     async def get_nutrition_entries(self, user_id: str, start_timestamp: int, end_timestamp: int) -> List[dict]:
@@ -282,8 +363,12 @@ class FirebaseService:
             .stream()
         
         result = []
-        for doc in docs:
+        async for doc in docs:
             data = doc.to_dict()
             data['id'] = doc.id
             result.append(data)
         return result
+
+
+# Shared instance so the whole process reuses one Firestore client
+firebase_service = FirebaseService()
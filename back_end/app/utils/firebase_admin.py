@@ -1,97 +1,401 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
 import firebase_admin
-from firebase_admin import credentials, firestore, auth
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from app.config import get_settings
 from pathlib import Path
 from typing import Optional, Dict
 
+# firebase_admin.credentials/firestore/auth pull in google-cloud-firestore, gRPC and
+# protobuf, so they are imported lazily where first needed to keep startup fast.
+
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Private key from the environment with escaped newlines restored
+_FIREBASE_PRIVATE_KEY = settings.FIREBASE_PRIVATE_KEY.replace('\\n', '\n')
+
+# Credentials file resolved once at import (relative paths are taken from the back_end folder)
+_BASE_DIR = Path(__file__).resolve().parent.parent.parent
+_CRED_PATH = (_BASE_DIR / settings.FIREBASE_CREDENTIALS_PATH).resolve() if settings.FIREBASE_CREDENTIALS_PATH else None
+_CRED_EXISTS = _CRED_PATH.exists() if _CRED_PATH else False
 
-# Initialize firestore client (will be None if initialization fails)
+# Native asyncio Firestore client (grpc.aio) serving all requests (None if initialization fails)
+_firestore_async_client = None
+
+# Sync Firestore client, only created if something asks for it
 _firestore_client = None
 
+# firebase_admin.auth module, imported on first token verification
+_auth = None
+
+# Cache of verified ID tokens: sha256(token) prefix -> decoded token (raw tokens are never stored)
+_token_cache: TTLCache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+# Signature verification is CPU-bound, so it gets its own pool sized to the CPU count
+_verify_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="firebase-verify")
+
+# Verifications currently running, so concurrent requests for the same token share one
+_inflight: Dict[bytes, asyncio.Future] = {}
+
+
+def _get_auth():
+    """Import firebase_admin.auth on first use"""
+    global _auth
+    if _auth is None:
+        from firebase_admin import auth
+        _auth = auth
+    return _auth
+
+
+@functools.lru_cache(maxsize=1)
+def _build_env_credential():
+    """Build the service account credential from environment settings (parsed once)"""
+    from firebase_admin import credentials
+    
+    cred_dict = {
+        "type": "service_account",
+        "project_id": settings.FIREBASE_PROJECT_ID,
+        "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
+        "private_key": _FIREBASE_PRIVATE_KEY,
+        "client_email": settings.FIREBASE_CLIENT_EMAIL,
+        "client_id": settings.FIREBASE_CLIENT_ID,
+        "auth_uri": settings.FIREBASE_AUTH_URI,
+        "token_uri": settings.FIREBASE_TOKEN_URI,
+    }
+    return credentials.Certificate(cred_dict)
+
+
+# Extra gRPC channel options for the Firestore client, on top of the library defaults
+# (30 s keepalive, unlimited message sizes): ping idle connections too and detect
+# dead peers quickly, so sustained traffic doesn't pay reconnect handshakes
+_FIRESTORE_EXTRA_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+
+def _firestore_channel_options():
+    """Library default channel options plus _FIRESTORE_EXTRA_CHANNEL_OPTIONS"""
+    from google.cloud.firestore_v1.base_client import _DEFAULT_CHANNEL_OPTIONS
+    
+    return list(_DEFAULT_CHANNEL_OPTIONS) + _FIRESTORE_EXTRA_CHANNEL_OPTIONS
+
+
+def _create_firestore_async_client():
+    """
+    Create the asyncio Firestore client for the default app, with its gRPC
+    channel tuned with _FIRESTORE_EXTRA_CHANNEL_OPTIONS
+    """
+    from google.cloud import firestore
+    
+    class _TunedAsyncClient(firestore.AsyncClient):
+        # The grpc.aio channel binds to the event loop that creates it, so it is still
+        # built lazily on first use (on the serving loop), just with our options.
+        # With FIRESTORE_EMULATOR_HOST set the library builds its emulator channel.
+        _channel_tuning_failed = False
+        
+        @property
+        def _firestore_api(self):
+            if self._firestore_api_internal is None and not self._channel_tuning_failed:
+                try:
+                    if self._emulator_host is None:
+                        self._build_tuned_firestore_api()
+                except Exception as e:
+                    # Library internals changed - keep the default channel
+                    self._channel_tuning_failed = True
+                    self._firestore_api_internal = None
+                    logger.warning("Using default Firestore channel options: %s", e)
+            return super()._firestore_api
+        
+        def _build_tuned_firestore_api(self):
+            from google.cloud.firestore_v1.services.firestore import async_client as firestore_gapic
+            from google.cloud.firestore_v1.services.firestore.transports.grpc_asyncio import (
+                FirestoreGrpcAsyncIOTransport,
+            )
+            
+            channel = FirestoreGrpcAsyncIOTransport.create_channel(
+                self._target,
+                credentials=self._credentials,
+                options=_firestore_channel_options(),
+            )
+            transport = FirestoreGrpcAsyncIOTransport(host=self._target, channel=channel)
+            api = firestore_gapic.FirestoreAsyncClient(
+                transport=transport, client_options=self._client_options
+            )
+            firestore_gapic._client_info = self._client_info
+            self._transport = transport
+            self._firestore_api_internal = api
+    
+    app = firebase_admin.get_app()
+    if not app.project_id:
+        raise ValueError("Project ID is required to access Firestore")
+    return _TunedAsyncClient(credentials=app.credential.get_credential(), project=app.project_id)
+
+
+class _FailOpenCache:
+    """
+    CacheControl cache wrapper that treats backend errors (e.g. Redis being down or
+    an unwritable cache directory) as cache misses, so an unavailable cache never fails token verification
+    """
+    
+    def __init__(self, cache):
+        self._cache = cache
+    
+    def get(self, key):
+        try:
+            return self._cache.get(key)
+        except Exception as e:
+            logger.warning("Public key cache read failed, fetching keys directly: %s", e)
+            return None
+    
+    def set(self, key, value, expires=None):
+        try:
+            self._cache.set(key, value, expires)
+        except Exception as e:
+            logger.warning("Public key cache write failed: %s", e)
+    
+    def delete(self, key):
+        try:
+            self._cache.delete(key)
+        except Exception as e:
+            logger.warning("Public key cache delete failed: %s", e)
+    
+    def close(self):
+        self._cache.close()
+
+
+def _is_private_dir(path: str) -> bool:
+    """
+    Create the directory if needed and check nobody else can plant files in it:
+    the cached certificates are what token signatures are checked against
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        logger.warning("Public key cache directory unavailable: %s", e)
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        logger.warning("Public key cache path is not a directory: %s", path)
+        return False
+    if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        logger.warning("Public key cache directory %s must be owned by this user with mode 0700", path)
+        return False
+    return True
+
+
+def _build_public_key_cache():
+    """Create the HTTP cache backend selected by FIREBASE_KEYS_CACHE_BACKEND ("file", "redis" or "memory")"""
+    backend = settings.FIREBASE_KEYS_CACHE_BACKEND
+    if backend == "redis":
+        import redis
+        from cachecontrol.caches.redis_cache import RedisCache
+        return _FailOpenCache(RedisCache(redis.Redis.from_url(settings.REDIS_URL)))
+    if backend == "file" and _is_private_dir(settings.FIREBASE_KEYS_CACHE_DIR):
+        from cachecontrol.caches.file_cache import FileCache
+        return _FailOpenCache(FileCache(settings.FIREBASE_KEYS_CACHE_DIR))
+    return None  # CacheControl default: in-memory dict
+
+
+def _use_shared_public_key_cache():
+    """
+    Make token verification read Google's public keys through a shared cache
+    (on disk or in Redis) instead of process memory, so the keys survive process
+    restarts. Entries expire according to the Cache-Control max-age Google
+    sends (about 6 hours).
+    """
+    try:
+        import cachecontrol
+        import requests
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        
+        # Swap the HTTP session behind the SDK's CertificateFetchRequest
+        request = _get_auth()._get_client(firebase_admin.get_app())._token_verifier.request
+        session = cachecontrol.CacheControl(requests.Session(), cache=_build_public_key_cache())
+        request._session = session
+        request._delegate = GoogleAuthRequest(session)
+    except Exception as e:
+        logger.warning("Public key cache disabled: %s", e)
+
 def initialize_firebase():
-    """Initialize Firebase Admin SDK"""
-    global _firestore_client
+    """Initialize Firebase Admin SDK (no-op once the Firestore client exists)"""
+    global _firestore_async_client
+    
+    if _firestore_async_client is not None:
+        return  # Client already created - reuse it
+    
+    from firebase_admin import credentials
     
     if firebase_admin._apps:
-        print("✅ Firebase already initialized")
-        _firestore_client = firestore.client()
-        return  # Already initialized
+        # App initialized elsewhere but no client cached yet - create it exactly once
+        logger.info("Firebase already initialized")
+        _firestore_async_client = _create_firestore_async_client()
+        _use_shared_public_key_cache()
+        return
     
     try:
-        # Determine base directory (back_end folder)
-        base_dir = Path(__file__).resolve().parent.parent.parent
-        
         # Try to load from credentials file if path provided
-        if settings.FIREBASE_CREDENTIALS_PATH:
-            # Handle both absolute and relative paths
-            cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
-            if not cred_path.is_absolute():
-                cred_path = base_dir / cred_path
-            
-            if cred_path.exists():
-                print(f"📄 Loading Firebase credentials from: {cred_path}")
-                cred = credentials.Certificate(str(cred_path))
+        if _CRED_PATH is not None:
+            if _CRED_EXISTS:
+                logger.info("Loading Firebase credentials from: %s", _CRED_PATH)
+                cred = credentials.Certificate(str(_CRED_PATH))
                 firebase_admin.initialize_app(cred)
-                _firestore_client = firestore.client()
-                print("✅ Firebase initialized successfully with Firestore access")
+                _firestore_async_client = _create_firestore_async_client()
+                _use_shared_public_key_cache()
+                logger.info("Firebase initialized successfully with Firestore access")
                 return
             else:
-                print(f"⚠️  Credentials file not found: {cred_path}")
+                logger.warning("Credentials file not found: %s", _CRED_PATH)
         
         # Try environment variables as fallback
         if settings.FIREBASE_PROJECT_ID and settings.FIREBASE_PRIVATE_KEY and settings.FIREBASE_CLIENT_EMAIL:
-            print("📄 Loading Firebase credentials from environment variables")
-            cred_dict = {
-                "type": "service_account",
-                "project_id": settings.FIREBASE_PROJECT_ID,
-                "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
-                "private_key": settings.FIREBASE_PRIVATE_KEY.replace('\\n', '\n'),
-                "client_email": settings.FIREBASE_CLIENT_EMAIL,
-                "client_id": settings.FIREBASE_CLIENT_ID,
-                "auth_uri": settings.FIREBASE_AUTH_URI,
-                "token_uri": settings.FIREBASE_TOKEN_URI,
-            }
-            cred = credentials.Certificate(cred_dict)
+            logger.info("Loading Firebase credentials from environment variables")
+            cred = _build_env_credential()
             firebase_admin.initialize_app(cred)
-            _firestore_client = firestore.client()
-            print("✅ Firebase initialized successfully with Firestore access")
+            _firestore_async_client = _create_firestore_async_client()
+            _use_shared_public_key_cache()
+            logger.info("Firebase initialized successfully with Firestore access")
             return
         
-        print("⚠️  No Firebase credentials found")
-        print("   Set FIREBASE_CREDENTIALS_PATH in .env or provide credentials")
-        print("   App will work in DEMO MODE without cloud sync")
+        logger.warning(
+            "No Firebase credentials found. Set FIREBASE_CREDENTIALS_PATH in .env or provide "
+            "credentials. App will work in DEMO MODE without cloud sync"
+        )
         
     except Exception as e:
-        print(f"❌ Firebase initialization failed: {e}")
-        print("   App will work in DEMO MODE without cloud sync")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Firebase initialization failed, app will work in DEMO MODE without cloud sync: %s", e)
 
 def get_firestore_client():
-    """Get the Firestore client instance"""
+    """Get a sync Firestore client, created on first call (None if Firebase is not initialized)"""
+    global _firestore_client
+    if _firestore_client is None and _firestore_async_client is not None:
+        from firebase_admin import firestore
+        _firestore_client = firestore.client()
     return _firestore_client
 
-def verify_firebase_token(id_token: str) -> Optional[Dict]:
+def get_firestore_async_client():
+    """Get the asyncio Firestore client instance (created once by initialize_firebase)"""
+    return _firestore_async_client
+
+async def warm_up_firestore():
+    """
+    Open the asyncio Firestore channel with a cheap RPC so the first user request
+    doesn't pay the TCP + TLS + gRPC handshake. Run it on the serving event loop:
+    grpc.aio channels bind to the loop that first uses them. Failures are ignored.
+    """
+    if _firestore_async_client is None:
+        return
+    try:
+        async for _ in _firestore_async_client.collections(retry=None, timeout=10):
+            break  # first page is enough
+    except Exception as e:
+        logger.debug("Firestore warm-up failed: %s", e)
+
+def _token_cache_key(id_token: str) -> bytes:
+    """
+    Cache key for an ID token: first 16 bytes of its SHA-256 digest, kept as
+    raw bytes (a quarter of a hex digest's size and cheap to hash and compare)
+    """
+    return hashlib.sha256(id_token.encode()).digest()[:16]
+
+def _get_cached_token(key: bytes) -> Optional[Dict]:
+    """Return a cached decoded token, or None if missing or past its 'exp' claim"""
+    with _token_cache_lock:
+        decoded_token = _token_cache.get(key)
+        if decoded_token is None:
+            return None
+        if decoded_token.get('exp', 0) > time.time():
+            return decoded_token
+        _token_cache.pop(key, None)
+        return None
+
+def verify_firebase_token(id_token: str, check_revoked: bool = False) -> Optional[Dict]:
     """
     Verify Firebase ID token and return decoded token with user info
     
+    Verified tokens are cached for AUTH_CACHE_TTL seconds (never past their
+    'exp' claim) so repeat calls skip the signature check. Invalid tokens
+    are not cached.
+    
+    Revocation is not checked by default: that costs an Admin API round trip
+    per request, so revocation is not detected until the token expires. Pass
+    check_revoked=True for sensitive operations; it bypasses the cache.
+    
     Args:
         id_token: Firebase ID token from client
+        check_revoked: Also check the user's tokens have not been revoked
         
     Returns:
         Dict with user info (uid, email, etc.) or None if invalid
     """
+    key = _token_cache_key(id_token)
+    if not check_revoked:
+        decoded_token = _get_cached_token(key)
+        if decoded_token is not None:
+            return decoded_token
+    
+    auth = _get_auth()
     try:
         # Verify the ID token
-        decoded_token = auth.verify_id_token(id_token)
-        return decoded_token
-    except auth.InvalidIdTokenError:
-        print("❌ Invalid Firebase ID token")
-        return None
+        decoded_token = auth.verify_id_token(id_token, check_revoked=check_revoked)
     except auth.ExpiredIdTokenError:
-        print("❌ Firebase ID token has expired")
+        # Checked before InvalidIdTokenError, which it subclasses
+        logger.debug("Firebase ID token has expired")
+        return None
+    except auth.RevokedIdTokenError:
+        logger.debug("Firebase ID token has been revoked")
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+        return None
+    except auth.InvalidIdTokenError:
+        logger.debug("Invalid Firebase ID token")
         return None
     except Exception as e:
-        print(f"❌ Error verifying Firebase token: {e}")
+        # Not a bad token: cert fetch, app setup or cache failures - make outages visible
+        logger.warning("Error verifying Firebase token: %s", e)
         return None
+    
+    if decoded_token.get('exp', 0) > time.time():
+        with _token_cache_lock:
+            _token_cache[key] = decoded_token
+    return decoded_token
+
+
+async def verify_firebase_token_cached(id_token: str) -> Optional[Dict]:
+    """
+    Verify Firebase ID token without blocking the event loop
+    
+    Cache hits are answered directly. On a miss the blocking verification
+    runs in the verification thread pool, and concurrent calls for the same
+    token wait on that single verification instead of repeating it.
+    
+    Args:
+        id_token: Firebase ID token from client
+        
+    Returns:
+        Dict with user info (uid, email, etc.) or None if invalid
+    """
+    key = _token_cache_key(id_token)
+    decoded_token = _get_cached_token(key)
+    if decoded_token is not None:
+        return decoded_token
+    
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_verify_pool, verify_firebase_token, id_token)
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # Shield so one caller being cancelled doesn't cancel the others' result
+    return await asyncio.shield(future)
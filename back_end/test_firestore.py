@@ -1,10 +1,13 @@
 """
 Test script to verify Firestore read/write operations
 Run this from the back_end directory: python test_firestore.py
+Add --benchmark to also measure batched write throughput
 """
 import asyncio
-from utils.firebase_admin import initialize_firebase
-from services.firebase_service import FirebaseService
+import sys
+import time
+from app.utils.firebase_admin import initialize_firebase
+from app.services.firebase_service import FirebaseService
 from datetime import datetime
 
 async def test_firestore_operations():
@@ -27,70 +30,31 @@ async def test_firestore_operations():
     
     print("✅ Firebase connected successfully!\n")
     
-    # Test 1: Write a test user
-    print("📝 TEST 1: Creating a test user...")
+    # Test 1: Write user, profile and vitals in a single batch
+    print("📝 TEST 1: Writing user, profile and daily vitals in one batch...")
+    now = datetime.utcnow().isoformat()
+    user_ref = firebase.db.collection('users').document()
+    user_id = user_ref.id
+    
     test_user_data = {
+        'id': user_id,
         'email': f'test_{datetime.now().timestamp()}@example.com',
         'username': 'test_user',
         'full_name': 'Test User',
-        'password_hash': 'dummy_hash_for_test'
+        'password_hash': 'dummy_hash_for_test',
+        'created_at': now
     }
     
-    try:
-        user_id = await firebase.create_user(test_user_data)
-        print(f"✅ User created with ID: {user_id}\n")
-    except Exception as e:
-        print(f"❌ Failed to create user: {e}\n")
-        return False
-    
-    # Test 2: Read the user back
-    print("📖 TEST 2: Reading the user back...")
-    try:
-        user_data = await firebase.get_user_by_id(user_id)
-        if user_data:
-            print(f"✅ User retrieved: {user_data['email']}\n")
-        else:
-            print("❌ User not found\n")
-            return False
-    except Exception as e:
-        print(f"❌ Failed to read user: {e}\n")
-        return False
-    
-    # Test 3: Update user profile
-    print("📝 TEST 3: Creating user profile...")
     profile_data = {
+        'user_id': user_id,
         'age': 30,
         'weight_kg': 70.0,
         'height_cm': 175.0,
         'daily_calorie_goal': 2000,
-        'daily_step_goal': 10000
+        'daily_step_goal': 10000,
+        'updated_at': now
     }
     
-    try:
-        await firebase.update_user_profile(user_id, profile_data)
-        print(f"✅ Profile created for user\n")
-    except Exception as e:
-        print(f"❌ Failed to create profile: {e}\n")
-        return False
-    
-    # Test 4: Read profile back
-    print("📖 TEST 4: Reading user profile...")
-    try:
-        profile = await firebase.get_user_profile(user_id)
-        if profile:
-            print(f"✅ Profile retrieved:")
-            print(f"   Age: {profile.get('age')}")
-            print(f"   Weight: {profile.get('weight_kg')} kg")
-            print(f"   Height: {profile.get('height_cm')} cm\n")
-        else:
-            print("❌ Profile not found\n")
-            return False
-    except Exception as e:
-        print(f"❌ Failed to read profile: {e}\n")
-        return False
-    
-    # Test 5: Store vitals data
-    print("📝 TEST 5: Storing daily vitals...")
     vitals_data = {
         'date': '2025-11-17',
         'readings': [
@@ -100,29 +64,54 @@ async def test_firestore_operations():
             'avg_heart_rate': 72,
             'avg_spo2': 98,
             'total_readings': 1
-        }
+        },
+        'synced_at': now
     }
     
     try:
-        await firebase.store_daily_vitals(user_id, '2025-11-17', vitals_data['readings'], vitals_data['summary'])
-        print(f"✅ Vitals data stored\n")
+        batch = firebase.write_batch()
+        batch.set(user_ref, test_user_data)
+        batch.set(user_ref.collection('profile').document('data'), profile_data, merge=True)
+        batch.set(user_ref.collection('daily_vitals').document('2025-11-17'), vitals_data)
+        await batch.commit()
+        print(f"✅ User, profile and vitals written for user ID: {user_id}\n")
     except Exception as e:
-        print(f"❌ Failed to store vitals: {e}\n")
+        print(f"❌ Failed to write batch: {e}\n")
         return False
     
-    # Test 6: Read vitals back
-    print("📖 TEST 6: Reading vitals data...")
+    # Test 2: Read user, profile and vitals back in a single round-trip
+    print("📖 TEST 2: Reading user, profile and vitals in one batched read...")
     try:
-        vitals = await firebase.get_vitals_by_date(user_id, '2025-11-17')
-        if vitals:
-            print(f"✅ Vitals retrieved:")
-            print(f"   Date: {vitals.get('date')}")
-            print(f"   Avg HR: {vitals.get('summary', {}).get('avg_heart_rate')}\n")
-        else:
-            print("❌ Vitals not found\n")
-            return False
+        user_data, profile, vitals = await firebase.get_many([
+            user_ref,
+            user_ref.collection('profile').document('data'),
+            user_ref.collection('daily_vitals').document('2025-11-17'),
+        ])
     except Exception as e:
-        print(f"❌ Failed to read vitals: {e}\n")
+        print(f"❌ Failed to read data: {e}\n")
+        return False
+    
+    if user_data:
+        print(f"✅ User retrieved: {user_data['email']}")
+    else:
+        print("❌ User not found\n")
+        return False
+    
+    if profile:
+        print(f"✅ Profile retrieved:")
+        print(f"   Age: {profile.get('age')}")
+        print(f"   Weight: {profile.get('weight_kg')} kg")
+        print(f"   Height: {profile.get('height_cm')} cm")
+    else:
+        print("❌ Profile not found\n")
+        return False
+    
+    if vitals:
+        print(f"✅ Vitals retrieved:")
+        print(f"   Date: {vitals.get('date')}")
+        print(f"   Avg HR: {vitals.get('summary', {}).get('avg_heart_rate')}\n")
+    else:
+        print("❌ Vitals not found\n")
         return False
     
     print("="*60)
@@ -135,6 +124,70 @@ async def test_firestore_operations():
     
     return True
 
+async def benchmark_writes(n: int = 1000, sequential_sample: int = 50):
+    """
+    Measure write throughput: N user documents via chunked batches (500 writes
+    each, 10 commits in flight) vs. one document at a time.
+    
+    The one-at-a-time path is timed on a smaller sample since it costs one
+    round-trip per document. All benchmark documents are deleted afterwards.
+    """
+    print("\n" + "="*60)
+    print(f"BENCHMARK: WRITING {n} USERS")
+    print("="*60 + "\n")
+    
+    firebase = FirebaseService()
+    if firebase.demo_mode:
+        print("❌ Firebase is in DEMO MODE - skipping benchmark")
+        return False
+    
+    collection = firebase.db.collection('benchmark_users')
+    now = datetime.utcnow().isoformat()
+    
+    def make_user(i):
+        return {
+            'email': f'bench_{i}@example.com',
+            'username': f'bench_user_{i}',
+            'full_name': 'Benchmark User',
+            'created_at': now
+        }
+    
+    ops = [(collection.document(), make_user(i), 'set') for i in range(n)]
+    sample = min(n, sequential_sample)
+    refs = [collection.document() for _ in range(sample)]
+    
+    try:
+        # Batched fan-out
+        start = time.perf_counter()
+        batches = await firebase.bulk_write(ops, concurrency=10)
+        batched_elapsed = time.perf_counter() - start
+        print(f"⚡ Batched: {n} writes in {batches} batches, {batched_elapsed:.2f}s "
+              f"({n / batched_elapsed:.0f} writes/s)")
+        
+        # One document at a time
+        start = time.perf_counter()
+        for i, ref in enumerate(refs):
+            await ref.set(make_user(i))
+        sequential_elapsed = time.perf_counter() - start
+        print(f"🐢 Sequential: {sample} writes in {sequential_elapsed:.2f}s "
+              f"({sample / sequential_elapsed:.0f} writes/s)")
+        
+        speedup = (n / batched_elapsed) / (sample / sequential_elapsed)
+        print(f"\n📊 Batched throughput is {speedup:.1f}x one-at-a-time\n")
+    finally:
+        # Clean up even if the benchmark failed partway (deleting a missing document is a no-op)
+        cleanup = [(ref, None, 'delete') for ref, _, _ in ops] + [(ref, None, 'delete') for ref in refs]
+        await firebase.bulk_write(cleanup, concurrency=10)
+        print("🧹 Benchmark documents deleted\n")
+    
+    return True
+
+async def main():
+    success = await test_firestore_operations()
+    if success and '--benchmark' in sys.argv:
+        success = await benchmark_writes()
+    return success
+
 if __name__ == "__main__":
-    success = asyncio.run(test_firestore_operations())
+    success = asyncio.run(main())
     exit(0 if success else 1)
@@ -0,0 +1,200 @@
+"""
+Tests for Firebase ID token verification caching and request coalescing
+Run from the back_end directory: python -m unittest discover tests
+"""
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import firebase_admin as fa
+
+
+class _InvalidIdTokenError(Exception):
+    pass
+
+
+class _ExpiredIdTokenError(_InvalidIdTokenError):
+    pass
+
+
+class _RevokedIdTokenError(_InvalidIdTokenError):
+    pass
+
+
+class StubAuth:
+    """Stands in for firebase_admin.auth: returns or raises whatever a test sets"""
+    InvalidIdTokenError = _InvalidIdTokenError
+    ExpiredIdTokenError = _ExpiredIdTokenError
+    RevokedIdTokenError = _RevokedIdTokenError
+
+    def __init__(self):
+        self.calls = []
+        self.result = None
+        self.error = None
+        self.gate = None  # threading.Event to hold verifications until set
+
+    def verify_id_token(self, id_token, check_revoked=False):
+        self.calls.append((id_token, check_revoked))
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+        return dict(self.result, token=id_token)
+
+
+def _decoded(exp_in=3600):
+    return {'uid': 'user123', 'email': 'user@example.com', 'exp': time.time() + exp_in}
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.auth = StubAuth()
+        self.auth.result = _decoded()
+        self._saved_auth = fa._auth
+        fa._auth = self.auth
+        fa._token_cache.clear()
+
+    def tearDown(self):
+        fa._auth = self._saved_auth
+        fa._token_cache.clear()
+
+    def test_valid_token_is_cached(self):
+        first = fa.verify_firebase_token('token-a')
+        second = fa.verify_firebase_token('token-a')
+
+        self.assertEqual(first['uid'], 'user123')
+        self.assertIs(first, second)
+        self.assertEqual(len(self.auth.calls), 1)
+
+    def test_cache_key_is_16_byte_digest(self):
+        fa.verify_firebase_token('token-a')
+
+        (key,) = fa._token_cache.keys()
+        self.assertIsInstance(key, bytes)
+        self.assertEqual(len(key), 16)
+
+    def test_cached_token_past_exp_is_evicted(self):
+        fa.verify_firebase_token('token-a')
+        key = fa._token_cache_key('token-a')
+        fa._token_cache[key] = dict(fa._token_cache[key], exp=time.time() - 1)
+
+        self.assertIsNone(fa._get_cached_token(key))
+        self.assertNotIn(key, fa._token_cache)
+
+        fa.verify_firebase_token('token-a')
+        self.assertEqual(len(self.auth.calls), 2)
+
+    def test_token_past_exp_is_not_cached(self):
+        self.auth.result = _decoded(exp_in=-1)
+
+        fa.verify_firebase_token('token-a')
+
+        self.assertEqual(len(fa._token_cache), 0)
+
+    def test_invalid_token_returns_none_and_is_not_cached(self):
+        self.auth.error = _InvalidIdTokenError('bad signature')
+
+        self.assertIsNone(fa.verify_firebase_token('token-a'))
+        self.assertIsNone(fa.verify_firebase_token('token-a'))
+        self.assertEqual(len(self.auth.calls), 2)
+        self.assertEqual(len(fa._token_cache), 0)
+
+    def test_expired_token_returns_none(self):
+        self.auth.error = _ExpiredIdTokenError('expired')
+
+        self.assertIsNone(fa.verify_firebase_token('token-a'))
+
+    def test_infrastructure_error_returns_none_and_logs_warning(self):
+        self.auth.error = RuntimeError('certificate fetch failed')
+
+        with self.assertLogs(fa.logger, level='WARNING'):
+            self.assertIsNone(fa.verify_firebase_token('token-a'))
+        self.assertEqual(len(fa._token_cache), 0)
+
+    def test_check_revoked_bypasses_cache(self):
+        fa.verify_firebase_token('token-a')
+        fa.verify_firebase_token('token-a', check_revoked=True)
+
+        self.assertEqual(self.auth.calls, [('token-a', False), ('token-a', True)])
+
+    def test_revoked_token_is_evicted(self):
+        fa.verify_firebase_token('token-a')
+        self.auth.error = _RevokedIdTokenError('revoked')
+
+        self.assertIsNone(fa.verify_firebase_token('token-a', check_revoked=True))
+        self.assertEqual(len(fa._token_cache), 0)
+
+
+class TokenCoalescingTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.auth = StubAuth()
+        self.auth.result = _decoded()
+        self._saved_auth = fa._auth
+        fa._auth = self.auth
+        fa._token_cache.clear()
+        fa._inflight.clear()
+        # Enough workers that uncoalesced calls would all run at once, whatever the CPU count
+        self._saved_pool = fa._verify_pool
+        fa._verify_pool = ThreadPoolExecutor(max_workers=10)
+
+    def tearDown(self):
+        if self.auth.gate is not None:
+            self.auth.gate.set()
+        fa._verify_pool.shutdown(wait=True)
+        fa._verify_pool = self._saved_pool
+        fa._auth = self._saved_auth
+        fa._token_cache.clear()
+        fa._inflight.clear()
+
+    async def test_concurrent_calls_share_one_verification(self):
+        self.auth.gate = threading.Event()
+        tasks = [asyncio.ensure_future(fa.verify_firebase_token_cached('token-a')) for _ in range(10)]
+        await asyncio.sleep(0.05)
+        self.auth.gate.set()
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(len(self.auth.calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(fa._inflight, {})
+
+    async def test_different_tokens_are_not_coalesced(self):
+        results = await asyncio.gather(
+            fa.verify_firebase_token_cached('token-a'),
+            fa.verify_firebase_token_cached('token-b'),
+        )
+
+        self.assertEqual([result['token'] for result in results], ['token-a', 'token-b'])
+        self.assertEqual(len(self.auth.calls), 2)
+
+    async def test_cache_hit_skips_the_pool(self):
+        await fa.verify_firebase_token_cached('token-a')
+        await fa.verify_firebase_token_cached('token-a')
+
+        self.assertEqual(len(self.auth.calls), 1)
+
+    async def test_cancelled_waiter_does_not_cancel_the_others(self):
+        self.auth.gate = threading.Event()
+        cancelled = asyncio.ensure_future(fa.verify_firebase_token_cached('token-a'))
+        other = asyncio.ensure_future(fa.verify_firebase_token_cached('token-a'))
+        await asyncio.sleep(0.05)
+        cancelled.cancel()
+        self.auth.gate.set()
+
+        result = await other
+        self.assertEqual(result['uid'], 'user123')
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(len(self.auth.calls), 1)
+
+    async def test_invalid_token_is_not_remembered(self):
+        self.auth.error = _InvalidIdTokenError('bad signature')
+
+        self.assertIsNone(await fa.verify_firebase_token_cached('token-a'))
+        self.assertIsNone(await fa.verify_firebase_token_cached('token-a'))
+        self.assertEqual(len(self.auth.calls), 2)
+        self.assertEqual(fa._inflight, {})
+
+
+if __name__ == '__main__':
+    unittest.main()